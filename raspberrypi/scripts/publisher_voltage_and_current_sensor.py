@@ -1,13 +1,23 @@
-import smbus
+import smbus2
+from smbus2 import i2c_msg
+import logging
+import os
+import struct
 import time
+import threading
 import zmq
-import concurrent.futures
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+log = logging.getLogger(__name__)
 
 INA226_I2C_ADDR     = 0x40
 REG_CONFIG          = 0x00
 REG_SHUNT_VOLTAGE   = 0x01
 REG_BUS_VOLTAGE     = 0x02
 RESET_COMMAND       = 0x8000
+CONFIG_VALUE        = 0x4127
 
 # Shunt resistor parameters
 SHUNT_RESISTOR = 0.1      # Ohms
@@ -20,63 +30,99 @@ STABLE_THRESHOLD = 3  # cycles of unchanging voltage to force reinit
 FAILURE_THRESHOLD = 3  # consecutive failures -> reinit
 VALID_READ_COUNT_FOR_RECONNECT = 2  # confirm reconnection after N valid reads
 
+READ_INTERVAL = 1.0  # seconds between sensor samples
+READ_TIMEOUT  = 1.0  # the loop waits READ_INTERVAL + READ_TIMEOUT for a new sample before counting a failed read
+
+# Wire format shared with the subscriber: voltage [V], current [A], SoC [%], status flags
+MESSAGE_FORMAT = struct.Struct('>fffB')
+STATUS_VALID   = 0x01  # set when voltage and current are real readings
+
 try:
-    bus = smbus.SMBus(1)
+    bus = smbus2.SMBus(1)
 except FileNotFoundError:
-    print("Error: I2C bus not found.")
+    log.error("Error: I2C bus not found.")
     exit(1)
 
+# Serializes access to the bus between the reader thread and the reinit path
+bus_lock = threading.Lock()
+
 
 #I2C helpers
 
-def write_register(register, value):
-    data = [(value >> 8) & 0xFF, value & 0xFF]
-    bus.write_i2c_block_data(INA226_I2C_ADDR, register, data)
+@contextmanager
+def bus_access():
+    """
+    Hold bus_lock for one I2C operation. Raises TimeoutError if the lock
+    can't be had within READ_TIMEOUT (e.g. the reader is stuck in a hung
+    transfer), so callers fail like any other bus error instead of blocking.
+    """
+    if not bus_lock.acquire(timeout=READ_TIMEOUT):
+        raise TimeoutError("I2C bus busy")
+    try:
+        yield
+    finally:
+        bus_lock.release()
+
+def register_bytes(value):
+    """Big-endian byte list for a 16-bit register value."""
+    return [(value >> 8) & 0xFF, value & 0xFF]
+
+def write_register(register, data):
+    """Write pre-encoded register bytes (see register_bytes)."""
+    with bus_access():
+        bus.write_i2c_block_data(INA226_I2C_ADDR, register, data)
 
 def read_register(register):
-    data = bus.read_i2c_block_data(INA226_I2C_ADDR, register, 2)
-    value = (data[0] << 8) | data[1]
-    return value
+    with bus_access():
+        raw = bus.read_word_data(INA226_I2C_ADDR, register)
+    # SMBus words are little-endian, INA226 registers are big-endian
+    return ((raw & 0xFF) << 8) | (raw >> 8)
 
 
 # INA226 Functions
 
+# The reset/configure writes never change, so encode them once at import
+_RESET_BYTES  = register_bytes(RESET_COMMAND)
+_CONFIG_BYTES = register_bytes(CONFIG_VALUE)
+_CONFIGURED_MSG = f"INA226 configured (CONFIG=0x{CONFIG_VALUE:04X})."
+
 def reset_ina226():
     try:
-        write_register(REG_CONFIG, RESET_COMMAND)
+        write_register(REG_CONFIG, _RESET_BYTES)
         time.sleep(0.1)
-        print("INA226 has been reset.")
+        log.info("INA226 has been reset.")
     except Exception as e:
-        print("Failed to reset INA226:", e)
+        log.error("Failed to reset INA226: %s", e)
 
 def configure_ina226():
-    config_value = 0x4127  
     try:
-        write_register(REG_CONFIG, config_value)
+        write_register(REG_CONFIG, _CONFIG_BYTES)
         time.sleep(0.1)
-        print(f"INA226 configured (CONFIG=0x{config_value:04X}).")
+        log.info(_CONFIGURED_MSG)
     except Exception as e:
-        print("Failed to configure INA226:", e)
+        log.error("Failed to configure INA226: %s", e)
 
-def measure_bus_voltage():
-    try:
-        raw = read_register(REG_BUS_VOLTAGE)
-        voltage_mV = raw * 1.25
-        voltage_V  = voltage_mV / 1000.0
-        return voltage_V
-    except Exception:
-        return None
+# Shunt and bus voltage are read in one combined i2c_rdwr transaction.
+# The messages are built once and their read buffers reused every cycle.
+_msg_shunt_reg = i2c_msg.write(INA226_I2C_ADDR, [REG_SHUNT_VOLTAGE])
+_msg_shunt     = i2c_msg.read(INA226_I2C_ADDR, 2)
+_msg_bus_reg   = i2c_msg.write(INA226_I2C_ADDR, [REG_BUS_VOLTAGE])
+_msg_bus       = i2c_msg.read(INA226_I2C_ADDR, 2)
 
-def measure_shunt_current():
+def measure_pair():
+    """
+    Returns (voltage_V, current_A), or (None, None) if the read failed.
+    """
     try:
-        raw = read_register(REG_SHUNT_VOLTAGE)
-        if raw > 0x7FFF:
-            raw -= 0x10000
-        shunt_voltage_V = raw * SHUNT_LSB
-        current_A = shunt_voltage_V / SHUNT_RESISTOR
-        return current_A
+        with bus_access():
+            bus.i2c_rdwr(_msg_shunt_reg, _msg_shunt, _msg_bus_reg, _msg_bus)
+        # signed shunt voltage, unsigned bus voltage (both big-endian)
+        raw_shunt, raw_bus = struct.unpack('>hH', bytes(_msg_shunt) + bytes(_msg_bus))
+        voltage_V = raw_bus * 1.25 / 1000.0
+        current_A = raw_shunt * SHUNT_LSB / SHUNT_RESISTOR
+        return voltage_V, current_A
     except Exception:
-        return None
+        return None, None
 
 def is_sensor_present():
     try:
@@ -85,128 +131,259 @@ def is_sensor_present():
     except Exception:
         return False
 
+# Sensor Reader Thread
+
+@dataclass(frozen=True)
+class Reading:
+    voltage: Optional[float] = None
+    current: Optional[float] = None
+
+class SensorReader(threading.Thread):
+    """
+    Long-lived thread that owns the periodic I2C reads.
+    The main loop waits for each new snapshot with a timeout, so a hung
+    bus shows up as a missing reading instead of blocking the publisher.
+    """
+    def __init__(self, interval=READ_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._reading = None  # no snapshot yet
+        self._wake = threading.Event()
+        self._running = True
+
+    def run(self):
+        while self._running:
+            voltage, current = measure_pair()
+            with self._cond:
+                self._reading = Reading(voltage, current)
+                self._cond.notify_all()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def next_reading(self, previous, timeout=READ_INTERVAL + READ_TIMEOUT):
+        """
+        Wait up to `timeout` seconds for a snapshot newer than `previous`
+        (None before the first one). Returns the new Reading, or None on timeout.
+        """
+        with self._cond:
+            if self._cond.wait_for(lambda: self._reading is not previous, timeout):
+                return self._reading
+        return None
+
+    def refresh(self, previous, timeout=READ_TIMEOUT):
+        """
+        Ask for an immediate sample (e.g. right after a reinit)
+        and wait up to `timeout` seconds for it, as in next_reading().
+        """
+        self._wake.set()
+        return self.next_reading(previous, timeout)
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+# Connection / Reinit State Machine
+
+# Actions returned by SensorState.update(), handled in order by the main loop
+DISCONNECTED    = "disconnected"
+REINIT_FAILURES = "reinit_failures"
+REINIT_STABLE   = "reinit_stable"
+RECONNECT       = "reconnect"
+
+# Failed read: (was_connected, fails >= FAILURE_THRESHOLD) -> actions
+_FAILED_READ_TRANSITIONS = {
+    (False, False): (),
+    (False, True):  (REINIT_FAILURES,),
+    (True,  False): (DISCONNECTED,),
+    (True,  True):  (DISCONNECTED, REINIT_FAILURES),
+}
+
+# Valid read: (was_connected, stable >= STABLE_THRESHOLD) -> actions
+_VALID_READ_TRANSITIONS = {
+    (False, False): (RECONNECT,),
+    (False, True):  (REINIT_STABLE, RECONNECT),
+    (True,  False): (),
+    (True,  True):  (REINIT_STABLE,),
+}
+
+class SensorState:
+    """
+    Counters behind the disconnect / reinit / reconnect logic of the publisher loop.
+    """
+    __slots__ = ('connected', 'fails', 'valid', 'last_v', 'stable')
+
+    def __init__(self):
+        self.connected = False
+        self.fails = 0       # consecutive failed reads
+        self.valid = 0       # consecutive valid reads
+        self.last_v = None   # last valid voltage
+        self.stable = 0      # consecutive cycles of unchanging voltage
+
+    def update(self, voltage):
+        """
+        Record one reading. Returns (voltage_is_valid, actions).
+        """
+        was_connected = self.connected
+        if voltage is None or voltage < 0.1:
+            self.fails += 1
+            self.valid = 0
+            self.stable = 0
+            self.connected = False
+            return False, _FAILED_READ_TRANSITIONS[(was_connected, self.fails >= FAILURE_THRESHOLD)]
+
+        self.fails = 0
+        self.valid += 1
+        if self.last_v is not None and abs(voltage - self.last_v) < TOLERANCE:
+            self.stable += 1
+        else:
+            self.stable = 0
+        return True, _VALID_READ_TRANSITIONS[(was_connected, self.stable >= STABLE_THRESHOLD)]
+
+    def reinit_done(self, kind):
+        """
+        Reset the counter that triggered a reinit (REINIT_FAILURES or REINIT_STABLE).
+        """
+        if kind == REINIT_FAILURES:
+            self.fails = 0
+        elif kind == REINIT_STABLE:
+            self.stable = 0
+
+    def commit(self, voltage):
+        """
+        Remember the voltage a valid cycle ended with (re-read after a
+        REINIT_STABLE), for the next cycle's unchanging-voltage check.
+        """
+        self.last_v = voltage
+
+    def try_reconnect(self):
+        """
+        Mark the sensor connected once enough valid reads have been seen.
+        """
+        if self.valid >= VALID_READ_COUNT_FOR_RECONNECT:
+            self.connected = True
+        return self.connected
+
 # State of Charge (SoC) Estimation
 
+# Example for a multi-cell battery; adjust as needed for your battery configuration.
+SOC_MIN_V = 14.8   # 0%
+SOC_MAX_V = 16.85  # 100%
+_SOC_SCALE = 100.0 / (SOC_MAX_V - SOC_MIN_V)
+
 def estimate_soc(voltage):
     """
-    Example for a multi-cell battery:
-      min_v = 14.8   # 0% 
-      max_v = 16.85  # 100%
-    Adjust as needed for your battery configuration.
+    Linear SoC between SOC_MIN_V (0%) and SOC_MAX_V (100%), clamped to 0-100.
     """
-    min_v = 14.8
-    max_v = 16.85
-
     if voltage is None:
         return 0.0
-    if voltage <= min_v:
-        return 0.0
-    elif voltage >= max_v:
-        return 100.0
-    else:
-        return (voltage - min_v) / (max_v - min_v) * 100.0
+    return max(0.0, min(100.0, (voltage - SOC_MIN_V) * _SOC_SCALE))
 
 
 # Main Script (Publisher)
 
-if __name__ == "__main__":
+def main():
+    # Per-message output is only shown with DEBUG set in the environment
+    logging.basicConfig(
+        level=logging.DEBUG if os.environ.get("DEBUG") else logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+
     reset_ina226()
     configure_ina226()
 
     context = zmq.Context()
     socket = context.socket(zmq.PUB)
+    # Keep the per-peer queue short and drop dead peers quickly, so a stalled
+    # subscriber can't back up the loop. PUB drops (never blocks) once a
+    # peer's queue is full, which is what a monitoring feed wants.
+    socket.setsockopt(zmq.SNDHWM, 10)
+    socket.setsockopt(zmq.TCP_KEEPALIVE, 1)
+    socket.setsockopt(zmq.TCP_KEEPALIVE_IDLE, 30)
+    socket.setsockopt(zmq.LINGER, 0)
     # IP address/port for publisher must be the same as the subscriber
     socket.bind("tcp://192.168.1.15:5555")
 
-    executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    reader = SensorReader()
+    reader.start()
 
-    def safe_read_voltage(timeout=1.0):
-        future = executor.submit(measure_bus_voltage)
-        try:
-            return future.result(timeout=timeout)
-        except concurrent.futures.TimeoutError:
-            return None
+    # Reused for every message; pyzmq copies frames this small on send,
+    # so overwriting it on the next cycle is safe.
+    buf = bytearray(MESSAGE_FORMAT.size)
+    buf_view = memoryview(buf)
 
-    def safe_read_current(timeout=1.0):
-        future = executor.submit(measure_shunt_current)
-        try:
-            return future.result(timeout=timeout)
-        except concurrent.futures.TimeoutError:
-            return None
+    state = SensorState()
+    previous = None  # last snapshot used; the first wait blocks until the reader has one
 
-    sensor_connected = False
-    consecutive_failures = 0
-    valid_read_count = 0
-    last_voltage = None
-    stable_count = 0
+    # Bind per-cycle lookups to locals once, outside the loop
+    next_reading = reader.next_reading
+    refresh = reader.refresh
+    update_state = state.update
+    pack_into = MESSAGE_FORMAT.pack_into
+    send = socket.send
+    sleep = time.sleep
+    debug_enabled = log.isEnabledFor(logging.DEBUG)  # logging is configured once above
 
     try:
+        # Paced by the reader: each cycle handles exactly one new snapshot
         while True:
-            voltage = safe_read_voltage()
-            current = safe_read_current()
+            reading = next_reading(previous)
+            if reading is None:
+                voltage = current = None  # no new snapshot in time: failed read
+            else:
+                previous = reading
+                voltage, current = reading.voltage, reading.current
+            is_valid, actions = update_state(voltage)
 
-            if (voltage is None or voltage < 0.1):
-                consecutive_failures += 1
-                valid_read_count = 0
-                stable_count = 0
+            if is_valid:
+                status_flags = STATUS_VALID if current is not None else 0
+                pack_into(buf, 0, voltage, current or 0.0, estimate_soc(voltage), status_flags)
+            else:
+                pack_into(buf, 0, 0.0, 0.0, 0.0, 0)
 
-                if sensor_connected:
-                    sensor_connected = False
-                    print("Battery Disconnected")
+            for action in actions:
+                if action == DISCONNECTED:
+                    log.info("Battery Disconnected")
 
-                if (consecutive_failures >= FAILURE_THRESHOLD) and is_sensor_present():
-                    print("Reinitializing sensor due to consecutive failures...")
+                elif action == REINIT_FAILURES and is_sensor_present():
+                    log.info("Reinitializing sensor due to consecutive failures...")
                     reset_ina226()
                     configure_ina226()
-                    time.sleep(0.5)
-                    consecutive_failures = 0
-
-                voltage_str = "Battery Disconnected"
-                current_str = "N/A"
-                soc_str = "N/A"
+                    sleep(0.5)
+                    state.reinit_done(action)
 
-            else:
-                consecutive_failures = 0
-                valid_read_count += 1
-
-                soc_percentage = estimate_soc(voltage)
-
-                voltage_str = f"{voltage:.3f} V"
-                current_str = f"{current:.6f} A" if current is not None else "N/A"
-                soc_str = f"{soc_percentage:.1f}%"
-
-                if last_voltage is not None and abs(voltage - last_voltage) < TOLERANCE:
-                    stable_count += 1
-                else:
-                    stable_count = 0
-
-                if stable_count >= STABLE_THRESHOLD:
-                    print("Forcing sensor reinitialization (unchanging voltage).")
+                elif action == REINIT_STABLE:
+                    log.info("Forcing sensor reinitialization (unchanging voltage).")
                     reset_ina226()
                     configure_ina226()
-                    time.sleep(0.25)
-                    voltage = safe_read_voltage()
-                    current = safe_read_current()
-                    stable_count = 0
-
-                if not sensor_connected and valid_read_count >= VALID_READ_COUNT_FOR_RECONNECT:
-                    sensor_connected = True
-                    print("Battery Reconnected")
-
-                last_voltage = voltage
-
-            publish_str = f"Voltage: {voltage_str}, Current: {current_str}, SoC: {soc_str}"
-            print(f"Publishing: {publish_str}")
-            socket.send_string(publish_str)
-
-            # Interval 1 second
-            time.sleep(1)
+                    sleep(0.25)
+                    reading = refresh(previous)
+                    if reading is None:
+                        voltage = current = None
+                    else:
+                        previous = reading
+                        voltage, current = reading.voltage, reading.current
+                    state.reinit_done(action)
+
+                elif action == RECONNECT and state.try_reconnect():
+                    log.info("Battery Reconnected")
+
+            if is_valid:
+                state.commit(voltage)
+
+            if debug_enabled:
+                log.debug("Publishing: Voltage: %.3f V, Current: %.6f A, SoC: %.1f%%, Status: 0x%02X",
+                          *MESSAGE_FORMAT.unpack_from(buf))
+            send(buf_view, copy=False)
 
     except KeyboardInterrupt:
-        print("Exiting...")
+        log.info("Exiting...")
     finally:
-        executor.shutdown(wait=False)
+        reader.stop()
+        reader.join(timeout=READ_TIMEOUT)
         bus.close()
         socket.close()
         context.term()
-        
\ No newline at end of file
+
+if __name__ == "__main__":
+    main()
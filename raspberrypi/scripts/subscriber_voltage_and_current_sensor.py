@@ -1,13 +1,64 @@
 import sys
-import re
-import time
+import struct
 
+import numpy as np
 import zmq
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtGui, QtCore
 
 from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel
-from PyQt6.QtCore import QThread, pyqtSignal
+from PyQt6.QtCore import QThread, Qt, pyqtSignal
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional; without it the sample kernel runs as plain Python
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+
+# Wire format shared with the publisher: voltage [V], current [A], SoC [%], status flags
+MESSAGE_FORMAT = struct.Struct('>fffB')
+STATUS_VALID   = 0x01  # set when voltage and current are real readings
+
+# Axis ranges are only re-applied when they change by more than this
+X_RANGE_PADDING    = 0.01  # fraction of the time span
+Y_RANGE_HYSTERESIS = 0.05  # fraction of the current Y span
+
+# Ring buffer rows
+ROW_TIME    = 0
+ROW_VOLTAGE = 1
+ROW_CURRENT = 2
+ROW_SOC     = 3
+
+SOC_ALPHA = 0.2  # Smoothing factor for the displayed SoC
+
+
+@njit(cache=True)
+def _on_sample(ring, cursor, state, elapsed_time, voltage, current, soc, alpha):
+    """
+    Smooth the SoC and write one sample into the ring buffer.
+    cursor holds [head, count], state holds [filtered_soc] (NaN before the first sample).
+    Returns the filtered SoC.
+    """
+    if np.isnan(state[0]):
+        state[0] = soc
+    else:
+        # Same as alpha * soc + (1 - alpha) * filtered, without the (1 - alpha) term
+        state[0] += alpha * (soc - state[0])
+
+    head = cursor[0]
+    ring[ROW_TIME, head] = elapsed_time
+    ring[ROW_VOLTAGE, head] = voltage
+    ring[ROW_CURRENT, head] = current
+    ring[ROW_SOC, head] = state[0]
+
+    max_points = ring.shape[1]
+    cursor[0] = (head + 1) % max_points
+    cursor[1] = min(cursor[1] + 1, max_points)
+    return state[0]
 
 
 # Subscriber Thread
@@ -15,9 +66,9 @@ from PyQt6.QtCore import QThread, pyqtSignal
 class BatterySubscriber(QThread):
     """
     A QThread that subscribes to your ZeroMQ publisher.
-    Emits new_message(str) whenever a new message arrives.
+    Emits new_message(bytes) whenever a new message arrives.
     """
-    new_message = pyqtSignal(str)
+    new_message = pyqtSignal(bytes)
 
     def __init__(self, zmq_url="tcp://192.168.1.15:5555"):
         super().__init__()
@@ -25,23 +76,30 @@ class BatterySubscriber(QThread):
         self.running = True
 
     def run(self):
-        context = zmq.Context()
+        # Process-wide context, so each subscriber doesn't start its own IO thread
+        context = zmq.Context.instance()
         socket = context.socket(zmq.SUB)
+        # Only the newest sample matters: keep at most one queued message
+        socket.setsockopt(zmq.CONFLATE, 1)
+        socket.setsockopt(zmq.RCVHWM, 1)
         socket.connect(self.zmq_url)
         # Subscribe to all messages
         socket.setsockopt_string(zmq.SUBSCRIBE, "")
         poller = zmq.Poller()
         poller.register(socket, zmq.POLLIN)
 
+        # Bind per-message lookups to locals once, outside the loop
+        poll = poller.poll
+        recv = socket.recv
+        emit = self.new_message.emit
+
         while self.running:
             # Wait up to 100 ms for data
-            socks = dict(poller.poll(100))
+            socks = dict(poll(100))
             if socket in socks and socks[socket] == zmq.POLLIN:
-                message = socket.recv_string()
-                self.new_message.emit(message)
+                emit(recv())
 
         socket.close()
-        context.term()
 
     def stop(self):
         self.running = False
@@ -65,91 +123,98 @@ class MainWindow(QWidget):
         self.time_left_label = QLabel("Time Left: --:--")
         layout.addWidget(self.time_left_label)
 
-        # Create the 3 plot widgets using PyQtGraph.
+        # Create the 3 plot widgets using PyQtGraph, each with a plain-text
+        # label above it for the latest value (titles are set only once).
+        self.voltage_label = self._make_value_label(layout)
         self.voltage_plot = pg.PlotWidget()
         self.voltage_plot.setTitle("Voltage (V)")
         layout.addWidget(self.voltage_plot)
 
+        self.current_label = self._make_value_label(layout)
         self.current_plot = pg.PlotWidget()
         self.current_plot.setTitle("Current (A)")
         layout.addWidget(self.current_plot)
 
+        self.soc_label = self._make_value_label(layout)
         self.soc_plot = pg.PlotWidget()
         self.soc_plot.setTitle("State of Charge (%)")
         layout.addWidget(self.soc_plot)
 
-        # Data storage
-        self.time_data = []
-        self.voltage_data = []
-        self.current_data = []
-        self.soc_data = []
+        # Only draw what is in view, decimated to the pixel width (keeps min/max spikes)
+        for plot in (self.voltage_plot, self.current_plot, self.soc_plot):
+            plot.setDownsampling(auto=True, mode='peak')
+            plot.setClipToView(True)
+
+        # Data storage: one preallocated ring buffer, one row per series
+        # (ROW_TIME, ROW_VOLTAGE, ROW_CURRENT, ROW_SOC)
         self.max_points = 300  # Rolling window of data
+        self._ring = np.empty((4, self.max_points), dtype=np.float32)
+        self._cursor = np.zeros(2, dtype=np.int64)  # [next column to write, number of valid columns]
+        self._state = np.array([np.nan])            # [filtered SoC]
 
         # Create plot curves
         self.voltage_curve = self.voltage_plot.plot(pen='y', name="Voltage")
         self.current_curve = self.current_plot.plot(pen='r', name="Current")
         self.soc_curve = self.soc_plot.plot(pen='g', name="SoC")
 
-        # Initialize filtered SoC attribute for smoothing
-        self.filtered_soc = None
-
         # Start the ZeroMQ subscriber thread
         self.subscriber = BatterySubscriber(zmq_url)
         self.subscriber.new_message.connect(self.handle_new_message)
         self.subscriber.start()
 
         # Time reference for x-axis in seconds
-        self.start_time = time.time()
+        self._timer = QtCore.QElapsedTimer()
+        self._timer.start()
 
         self.battery_capacity = 10.0  # [Ah]
 
-        # Timer to update the plots 5x per second
-        self.update_timer = QtCore.QTimer()
-        self.update_timer.timeout.connect(self.update_plots)
-        self.update_timer.start(200)
+        # Last applied axis ranges, so unchanged ranges are not re-applied
+        self._last_x_max = None
+        self._last_yrange = {}
+
+        # Plots are redrawn only when new data arrives; bursts within
+        # 100 ms are coalesced into a single redraw.
+        self.redraw_timer = QtCore.QTimer()
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.setInterval(100)
+        self.redraw_timer.timeout.connect(self.update_plots)
+
+    @staticmethod
+    def _make_value_label(layout):
+        label = QLabel("--")
+        label.setTextFormat(Qt.TextFormat.PlainText)
+        label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        label.setStyleSheet("font-size: 14px;")
+        layout.addWidget(label)
+        return label
 
     def handle_new_message(self, msg):
         """
-        Parse the incoming string from the publisher,
-        e.g. "Voltage: 15.234 V, Current: 0.1150 A, SoC: 40.2%"
+        Unpack the binary sample from the publisher (see MESSAGE_FORMAT)
         and update sensor data. The SoC value is smoothed to reduce fluctuations.
         """
-        match = re.search(
-            r"Voltage:\s*([\d.]+)\s*V,\s*Current:\s*([\d.]+)\s*A,\s*SoC:\s*([\d.]+)%",
-            msg
+        try:
+            voltage_val, current_val, soc_val, status_flags = MESSAGE_FORMAT.unpack_from(msg)
+        except struct.error:
+            return  # Invalid message
+
+        if not status_flags & STATUS_VALID:
+            return  # Battery disconnected, nothing to plot
+
+        elapsed_time = self._timer.elapsed() / 1000.0
+
+        # Apply exponential smoothing to the SoC value and store the sample
+        # (with the filtered SoC) in the ring buffer for plotting.
+        filtered_soc = _on_sample(
+            self._ring, self._cursor, self._state,
+            elapsed_time, voltage_val, current_val, soc_val, SOC_ALPHA
         )
-        if match:
-            try:
-                voltage_val = float(match.group(1))
-                current_val = float(match.group(2))
-                soc_val = float(match.group(3))
-            except ValueError:
-                return  # Invalid parse
-
-            elapsed_time = time.time() - self.start_time
-            self.time_data.append(elapsed_time)
-            self.voltage_data.append(voltage_val)
-            self.current_data.append(current_val)
-
-            # Apply exponential smoothing to the SoC value.
-            alpha = 0.2  # Smoothing factor
-            if self.filtered_soc is None:
-                self.filtered_soc = soc_val
-            else:
-                self.filtered_soc = alpha * soc_val + (1 - alpha) * self.filtered_soc
-
-            # Append the filtered SoC to our data for plotting.
-            self.soc_data.append(self.filtered_soc)
-
-            
-            if len(self.time_data) > self.max_points:
-                self.time_data = self.time_data[-self.max_points:]
-                self.voltage_data = self.voltage_data[-self.max_points:]
-                self.current_data = self.current_data[-self.max_points:]
-                self.soc_data = self.soc_data[-self.max_points:]
-
-            # Estimate battery time left using the filtered SoC value
-            self.update_time_left(self.filtered_soc, current_val)
+
+        # Estimate battery time left using the filtered SoC value
+        self.update_time_left(filtered_soc, current_val)
+
+        if not self.redraw_timer.isActive():
+            self.redraw_timer.start()
 
     def update_time_left(self, soc_percent, current_amp):
         """
@@ -171,60 +236,85 @@ class MainWindow(QWidget):
             mins = total_minutes % 60
             self.time_left_label.setText(f"Time Left: {hrs} h {mins} min {seconds} s")
 
+    def _ordered_data(self):
+        """
+        Return the ring buffer contents oldest-first as a (4, count) array.
+        This is a view unless the buffer has wrapped.
+        """
+        head, count = self._cursor
+        if count < self.max_points or head == 0:
+            return self._ring[:, :count]
+        return np.concatenate((self._ring[:, head:], self._ring[:, :head]), axis=1)
+
     def update_plots(self):
         """
         Update the data for the three plots (Voltage, Current, SoC)
-        and update the plot titles to display the latest numerical values.
+        and update the value labels to display the latest numerical values.
         """
-        if not self.time_data:
+        if not self._cursor[1]:
             return
 
+        data = self._ordered_data()
+        time_data = data[ROW_TIME]
+        voltage_data = data[ROW_VOLTAGE]
+        current_data = data[ROW_CURRENT]
+        soc_data = data[ROW_SOC]
+
         # Update curves with new data
-        self.voltage_curve.setData(self.time_data, self.voltage_data)
-        self.current_curve.setData(self.time_data, self.current_data)
-        self.soc_curve.setData(self.time_data, self.soc_data)
+        self.voltage_curve.setData(x=time_data, y=voltage_data)
+        self.current_curve.setData(x=time_data, y=current_data)
+        self.soc_curve.setData(x=time_data, y=soc_data)
 
         # updated data point for each measurement
-        last_voltage = self.voltage_data[-1]
-        last_current = self.current_data[-1]
-        last_soc = self.soc_data[-1]
-
-        # Update the titles with the real-time numerical values right under the title.
-        self.voltage_plot.setTitle(
-            f"Voltage (V)<br><span style='font-size:14px; color:#FFF;'>{last_voltage:.3f} V</span>"
-        )
-        self.current_plot.setTitle(
-            f"Current (A)<br><span style='font-size:14px; color:#FFF;'>{last_current:.4f} A</span>"
-        )
-        self.soc_plot.setTitle(
-            f"State of Charge (%)<br><span style='font-size:14px; color:#FFF;'>{last_soc:.1f} %</span>"
-        )
-
-        # Update X-range based on time data
-        x_min = self.time_data[0]
-        x_max = self.time_data[-1]
+        last_voltage = voltage_data[-1]
+        last_current = current_data[-1]
+        last_soc = soc_data[-1]
+
+        # Update the value labels with the real-time numerical values.
+        self.voltage_label.setText(f"{last_voltage:.3f} V")
+        self.current_label.setText(f"{last_current:.4f} A")
+        self.soc_label.setText(f"{last_soc:.1f} %")
+
+        # Update X-range based on time data. The newest point stays visible
+        # until it moves past the right-hand padding, so only shift then.
+        x_min = float(time_data[0])
+        x_max = float(time_data[-1])
+        if self._last_x_max is None or x_max - self._last_x_max > (x_max - x_min) * X_RANGE_PADDING:
+            for plot in (self.voltage_plot, self.current_plot, self.soc_plot):
+                plot.setXRange(x_min, x_max, padding=X_RANGE_PADDING)
+            self._last_x_max = x_max
 
         # Manually update Y-axis range for each plot
-        v_min = min(self.voltage_data)
-        v_max = max(self.voltage_data)
+        v_min = float(voltage_data.min())
+        v_max = float(voltage_data.max())
         v_range = v_max - v_min if v_max != v_min else 1.0
         v_margin = v_range * 0.1
-        self.voltage_plot.setXRange(x_min, x_max, padding=0.01)
-        self.voltage_plot.setYRange(v_min - v_margin, v_max + v_margin)
+        self._set_y_range('voltage', self.voltage_plot, v_min - v_margin, v_max + v_margin)
 
-        c_min = min(self.current_data)
-        c_max = max(self.current_data)
+        c_min = float(current_data.min())
+        c_max = float(current_data.max())
         c_range = c_max - c_min if c_max != c_min else 1.0
         c_margin = c_range * 0.1
-        self.current_plot.setXRange(x_min, x_max, padding=0.01)
-        self.current_plot.setYRange(c_min - c_margin, c_max + c_margin)
+        self._set_y_range('current', self.current_plot, c_min - c_margin, c_max + c_margin)
 
-        s_min = min(self.soc_data)
-        s_max = max(self.soc_data)
+        s_min = float(soc_data.min())
+        s_max = float(soc_data.max())
         s_range = s_max - s_min if s_max != s_min else 1.0
         s_margin = s_range * 0.1
-        self.soc_plot.setXRange(x_min, x_max, padding=0.01)
-        self.soc_plot.setYRange(s_min - s_margin, s_max + s_margin)
+        self._set_y_range('soc', self.soc_plot, s_min - s_margin, s_max + s_margin)
+
+    def _set_y_range(self, key, plot, lo, hi):
+        """
+        Apply a Y-range unless both ends are within Y_RANGE_HYSTERESIS
+        of the range last applied to this plot.
+        """
+        last = self._last_yrange.get(key)
+        if last is not None:
+            tolerance = (last[1] - last[0]) * Y_RANGE_HYSTERESIS
+            if abs(lo - last[0]) <= tolerance and abs(hi - last[1]) <= tolerance:
+                return
+        plot.setYRange(lo, hi)
+        self._last_yrange[key] = (lo, hi)
 
     def closeEvent(self, event):
         """